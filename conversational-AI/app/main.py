@@ -1,21 +1,21 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import create_engine, Column, Integer, String, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import logging
 import os
 import shutil
-import time
 from uuid import uuid4
 from datetime import datetime
 from pydantic import BaseModel
-import psutil
 
 # Define SQLAlchemy base and database session
 Base = declarative_base()
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Dependency to get DB session
@@ -54,62 +54,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Utility function to handle file deletion errors
-def remove_readonly(func, path, exc_info):
-    import stat
-    os.chmod(path, stat.S_IWRITE)
-    func(path)
+logger = logging.getLogger(__name__)
 
-def close_open_files(directory):
-    """
-    Ensure all file handles in the directory are closed.
-    """
-    for proc in psutil.process_iter(['pid', 'name']):
-        try:
-            for open_file in proc.open_files():
-                if directory in open_file.path:
-                    proc.terminate()  # Terminate the process using the file
-        except Exception:
-            pass  # Ignore errors from inaccessible processes
+DEFAULT_PDF_PATH = "./food.pdf"
 
-def cleanup_directory(directory):
+@app.on_event("startup")
+def seed_default_document():
     """
-    Safely clean up a directory, ensuring no lingering file handles.
+    Index the bundled food PDF on first run only, so deleting it later sticks
+    across restarts. A failure is logged
+    rather than raised: the API must still come up without OpenAI.
+    Reader workers skip this: only the writer process touches the index.
     """
-    if os.path.exists(directory):
-        # Wait briefly to allow processes to release locks
-        time.sleep(0.5)
+    from services.process_documents import default_document_pending, ingest_document, mark_default_document_seeded
+    from services.vector_index import APP_ROLE, ensure_snapshot
 
-        # Ensure no processes are locking files
-        close_open_files(directory)
-
-        # Retry deleting the directory
+    if APP_ROLE == "reader":
+        return
+    if os.path.exists(DEFAULT_PDF_PATH):
+        db = SessionLocal()
         try:
-            shutil.rmtree(directory, onerror=remove_readonly)
-        except Exception as e:
-            raise RuntimeError(f"Failed to delete {directory}: {str(e)}")
-
+            if default_document_pending(db):
+                ingest_document(db, DEFAULT_PDF_PATH, os.path.basename(DEFAULT_PDF_PATH))
+                mark_default_document_seeded()
+        except Exception:
+            logger.exception("Could not index %s at startup", DEFAULT_PDF_PATH)
+        finally:
+            db.close()
+    # Publish even if seeding failed, so readers can serve what is indexed
+    ensure_snapshot()
+
+def require_writer():
+    from services.vector_index import APP_ROLE
+
+    if APP_ROLE == "reader":
+        raise HTTPException(
+            status_code=503,
+            detail="This worker serves queries only; send document changes to the writer process."
+        )
+
+def save_upload(file: UploadFile):
+    from services.process_documents import UPLOAD_DIR
+
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid4()}_{file.filename}")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+    return file_path
+
+# A plain def runs in the threadpool: switching to a new index snapshot copies
+# it, and the OpenAI/Groq calls block, so none of it may stall the event loop.
 @app.post("/messages")
-async def handle_message(content: MessageRequest, db: Session = Depends(get_db)):
+def handle_message(content: MessageRequest, db: Session = Depends(get_db)):
     from services.classify_message import classify_query
-    from services.rag_service import initialize_clients, store_document_in_chroma, generate_response
+    from services.rag_service import answer_question
     from services.weather_service import get_weather_response
 
     classification = classify_query(content.content)
 
-    # Initialize Chroma clients
-    groq_client, docsearch = initialize_clients()
-
-    try:
-        pdf_path = "./food.pdf"
-        store_document_in_chroma(docsearch, pdf_path)
-
-    finally:
-        # Clean up Chroma data
-        cleanup_directory("./chroma_data")
-
     if classification == "food":
-        response = generate_response(content.content)
+        try:
+            response = answer_question(content.content)
+        except RuntimeError as e:
+            # Reader worker started before the writer published an index
+            raise HTTPException(status_code=503, detail=str(e))
     elif classification == "weather":
         response = get_weather_response()
     else:
@@ -124,40 +132,67 @@ async def handle_message(content: MessageRequest, db: Session = Depends(get_db))
 
     return {"response": response}
 
-@app.post("/documents")
-async def process_document(file: UploadFile = File(...)):
-    from services.process_documents import embed_chunks, store_chunks_in_chromadb, split_pdf_into_chunks
+@app.get("/documents")
+async def get_documents(db: Session = Depends(get_db)):
+    from services.process_documents import list_documents
 
-    try:
-        # Save the uploaded file
-        file_path = f"./uploads/{uuid4()}_{file.filename}"
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+    return {"documents": list_documents(db)}
 
-        # Split PDF into chunks
-        chunks = split_pdf_into_chunks(file_path)
+def ingest_upload(file: UploadFile, db: Session, document_id=None):
+    from services.process_documents import ingest_document, discard_upload
 
-        # Generate embeddings for the chunks
-        embeddings = embed_chunks(chunks)
+    require_writer()
+    file_path = None
+    try:
+        # Save the uploaded file
+        file_path = save_upload(file)
 
-        # Store chunks and embeddings in ChromaDB
-        store_chunks_in_chromadb(chunks, embeddings)
+        # Only chunks that are not indexed yet get embedded
+        result = ingest_document(db, file_path, file.filename, document_id=document_id)
 
         # Return success response
         return {
             "message": "Document processed and stored successfully.",
-            "num_chunks": len(chunks),
-            "document_name": file.filename
+            "document_name": file.filename,
+            **result
         }
 
     except Exception as e:
+        db.rollback()
+        if file_path is not None:
+            discard_upload(db, file_path)
+        if isinstance(e, LookupError):
+            raise HTTPException(status_code=404, detail=str(e))
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
+# Embedding and snapshot publishing are slow, so they run in the threadpool
+# (serialised by the ingest lock) instead of blocking the event loop.
+@app.post("/documents")
+async def process_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    return await run_in_threadpool(ingest_upload, file, db)
+
+@app.put("/documents/{document_id}")
+async def replace_document(document_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    return await run_in_threadpool(ingest_upload, file, db, document_id)
+
+@app.delete("/documents/{document_id}")
+async def remove_document(document_id: int, db: Session = Depends(get_db)):
+    from services.process_documents import delete_document
+
+    require_writer()
+    try:
+        await run_in_threadpool(delete_document, db, document_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {"message": "Document deleted successfully.", "document_id": document_id}
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the AI Assistant API"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Single process. For multiple workers run gunicorn with gunicorn.conf.py as
+    # readers, next to one process started with APP_ROLE=writer.
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
\ No newline at end of file
@@ -15,12 +15,14 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    content_hash = Column(String, index=True)
     is_processed = Column(Boolean, default=False)
+    pages = relationship("DocumentPage", back_populates="document", cascade="all, delete-orphan")
 
 class DocumentPage(Base):
     __tablename__ = "document_pages"
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
     page_number = Column(Integer, nullable=False)
     content = Column(String, nullable=False)
     is_processed = Column(Boolean, default=False)
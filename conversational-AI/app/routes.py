@@ -11,8 +11,7 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 import os
 import shutil
 from uuid import uuid4
-from services.process_documents import embed_chunks, store_chunks_in_chromadb,split_pdf_into_chunks
-from services.rag_service import initialize_clients, store_document_in_chroma, generate_response
+from services.rag_service import answer_question
 
 @router.post("/messages")
  
@@ -20,20 +19,11 @@ async def handle_message( content, db: Session = Depends(get_db)):
     
     classification = classify_query(content)
     
-    groq_client, docsearch = initialize_clients()
-    
-    try:
-        pdf_path = "./food.pdf"
-        store_document_in_chroma(docsearch, pdf_path)
-
-    
-    finally:
-        # Clean up Chroma data
-        if os.path.exists("./chroma_data"):
-            shutil.rmtree("./chroma_data")
-
     if classification == "food":
-        response = generate_response(content)
+        try:
+            response = answer_question(content)
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
     elif classification == "weather":
         response = get_weather_response()
     else:
@@ -49,32 +39,4 @@ async def handle_message( content, db: Session = Depends(get_db)):
     return {"response": response}
 
 
-# Endpoint to process a PDF document
-@router.post("/documents")
-async def process_document(file: UploadFile = File(...)):
-    try:
-        # Save the uploaded file
-        file_path = f"./uploads/{uuid4()}_{file.filename}"
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        # Split PDF into chunks
-        chunks = split_pdf_into_chunks(file_path)
-
-        # Generate embeddings for the chunks
-        embeddings = embed_chunks(chunks)
-
-        # Store chunks and embeddings in ChromaDB
-        store_chunks_in_chromadb(chunks, embeddings)
-
-        # Return success response
-        return {
-            "message": "Document processed and stored successfully.",
-            "num_chunks": len(chunks),
-            "document_name": file.filename
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
-
+# Document endpoints live in main.py only; this router is not mounted.
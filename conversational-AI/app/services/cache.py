@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from services.vector_index import APP_ROLE
+load_dotenv()
+
+# "memory" keeps entries inside this process; "sqlite" stores them in CACHE_PATH
+# so every worker on the host shares them. Multi-worker roles default to sqlite.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory" if APP_ROLE == "standalone" else "sqlite")
+CACHE_PATH = os.getenv("CACHE_PATH", "./cache.db")
+MEMORY_CACHE_MAX_ENTRIES = 1024
+
+_memory = {}
+_memory_lock = threading.Lock()
+_sqlite_ready = False
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _connect():
+    global _sqlite_ready
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    if not _sqlite_ready:
+        # WAL lets workers read while another one writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+        conn.commit()
+        _sqlite_ready = True
+    return conn
+
+def cache_get(key):
+    """
+    Return the cached string for `key`, or None if it is missing or expired.
+    """
+    now = time.time()
+    if CACHE_BACKEND == "sqlite":
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+def cache_set(key, value, ttl):
+    """
+    Store the string `value` under `key` for `ttl` seconds.
+    """
+    now = time.time()
+    if CACHE_BACKEND == "sqlite":
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return
+
+    with _memory_lock:
+        if len(_memory) >= MEMORY_CACHE_MAX_ENTRIES:
+            for stale_key in [k for k, (_, expires_at) in _memory.items() if expires_at <= now]:
+                del _memory[stale_key]
+            if len(_memory) >= MEMORY_CACHE_MAX_ENTRIES:
+                # Still full: drop the entry closest to expiring
+                del _memory[min(_memory, key=lambda k: _memory[k][1])]
+        _memory[key] = (value, now + ttl)
@@ -1,90 +1,321 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import openai
+import hashlib
+import os
 import PyPDF2
-import chromadb
-from uuid import uuid4
 from dotenv import load_dotenv
-import os
 from openai import OpenAI
+from sqlalchemy import inspect, text
+from db import Base, engine
+from models import Document, DocumentPage
+from services.vector_index import APP_ROLE, COLLECTION_NAME, EMBEDDING_MODEL, get_writer_client, index_changed, ingest_lock
 load_dotenv()
 
-# Database connection
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# Define the Message and Document models
-class Message(Base):
-    __tablename__ = "messages"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    is_ai = Column(Boolean, default=False)
-    content = Column(String, index=True)
-    timestamp = Column(String)
-
-class Document(Base):
-    __tablename__ = "documents"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String)
-    file_path = Column(String)
-    is_processed = Column(Boolean, default=False)
-
-class DocumentPage(Base):
-    __tablename__ = "document_pages"
-    
-    document_id = Column(Integer, index=True)
-    page_number = Column(Integer, primary_key=True)
-    content = Column(String)
-    is_processed = Column(Boolean, default=False)
-
-Base.metadata.create_all(bind=engine)
+UPLOAD_DIR = "./uploads"
+DEFAULT_SEEDED_KEY = "default_document_seeded"
+
+def upgrade_schema(bind):
+    """
+    Bring tables created by older versions up to date; create_all never alters
+    an existing table. Older databases lack documents.content_hash and have a
+    document_pages table keyed on page_number alone.
+    """
+    inspector = inspect(bind)
+    tables = inspector.get_table_names()
+    with bind.begin() as conn:
+        if "documents" in tables:
+            columns = {column["name"] for column in inspector.get_columns("documents")}
+            if "content_hash" not in columns:
+                conn.execute(text("ALTER TABLE documents ADD COLUMN content_hash VARCHAR"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)"))
+        if "document_pages" in tables:
+            columns = {column["name"] for column in inspector.get_columns("document_pages")}
+            if "id" not in columns:
+                conn.execute(text("ALTER TABLE document_pages RENAME TO document_pages_old"))
+                conn.execute(text("DROP INDEX IF EXISTS ix_document_pages_document_id"))
+                DocumentPage.__table__.create(bind=conn)
+                conn.execute(text(
+                    "INSERT INTO document_pages (document_id, page_number, content, is_processed) "
+                    "SELECT document_id, page_number, COALESCE(content, ''), is_processed FROM document_pages_old "
+                    "WHERE document_id IS NOT NULL"
+                ))
+                conn.execute(text("DROP TABLE document_pages_old"))
+
+# Only the process that owns ingestion changes the schema; reader workers
+# would otherwise race each other migrating the shared database.
+if APP_ROLE != "reader":
+    upgrade_schema(engine)
+    Base.metadata.create_all(bind=engine)
 
 client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY")
 )
 
-client = chromadb.Client()
-collection = client.create_collection("documents")
+def get_collection():
+    """
+    One persistent collection holds the chunks of every document; each chunk
+    carries its document_id so a document can be replaced or removed on its own.
+    """
+    return get_writer_client().get_or_create_collection(COLLECTION_NAME)
 
-def split_pdf_into_chunks(file_path, chunk_size=500):
-    chunks = []
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extract_pages(file_path):
+    pages = []
     with open(file_path, "rb") as file:
         reader = PyPDF2.PdfReader(file)
         for page_num, page in enumerate(reader.pages):
             text = page.extract_text()
             if text:
-                # Split text into chunks of `chunk_size` characters
-                for i in range(0, len(text), chunk_size):
-                    chunk = text[i:i + chunk_size].strip()
-                    if chunk:
-                        chunks.append({"page_number": page_num, "content": chunk})
+                pages.append({"page_number": page_num, "content": text})
+    return pages
+
+def split_pages_into_chunks(pages, chunk_size=500):
+    chunks = []
+    for page in pages:
+        text = page["content"]
+        # Split text into chunks of `chunk_size` characters
+        for i in range(0, len(text), chunk_size):
+            chunk = text[i:i + chunk_size].strip()
+            if chunk:
+                chunks.append({"page_number": page["page_number"], "content": chunk})
     return chunks
 
-def embed_chunks(chunks):
-    
-    texts = [chunk['content'] for chunk in chunks]
-    response = openai.embeddings.create(
-        model="text-embedding-3-small", 
-        input=texts)
-    
-    return response.data[0].embedding
-            
-    
-def store_chunks_in_chromadb(chunks, embeddings):
-    for chunk, embedding in zip(chunks, embeddings):
-        collection.add(
-            documents=[chunk['content']],
-            metadatas=[{"page_number": chunk['page_number']}],
-            embeddings=[embedding],
-            ids=[str(uuid4())]
-        )
-
-
-chunks =split_pdf_into_chunks(r"./food.pdf")
-emb = embed_chunks(chunks)
-
-store_chunks_in_chromadb(chunks,emb )
\ No newline at end of file
+def split_pdf_into_chunks(file_path, chunk_size=500):
+    return split_pages_into_chunks(extract_pages(file_path), chunk_size)
+
+def _chunk_digest(chunk):
+    return hashlib.sha256(chunk["content"].encode("utf-8")).hexdigest()[:16]
+
+def chunk_id(document_id, chunk):
+    """
+    Build a stable id from the chunk's document, page and text, so an unchanged
+    chunk maps to the same id across re-uploads and is never embedded twice.
+    """
+    return f"{document_id}-{chunk['page_number']}-{_chunk_digest(chunk)}"
+
+def embed_chunks(chunks, batch_size=100):
+    embeddings = []
+    for i in range(0, len(chunks), batch_size):
+        texts = [chunk['content'] for chunk in chunks[i:i + batch_size]]
+        response = client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=texts)
+        embeddings.extend(item.embedding for item in response.data)
+    return embeddings
+
+def store_chunks_in_chromadb(document_id, chunks, embeddings):
+    if not chunks:
+        return
+    get_collection().upsert(
+        ids=[chunk_id(document_id, chunk) for chunk in chunks],
+        documents=[chunk['content'] for chunk in chunks],
+        metadatas=[{"document_id": document_id, "page_number": chunk['page_number']} for chunk in chunks],
+        embeddings=embeddings
+    )
+
+def plan_document_chunks(document_id, chunks):
+    """
+    Compare `chunks` with what is stored for `document_id` (None for a document
+    that has no vectors yet). Stored chunks are matched on their text alone, so
+    a chunk that only moved to another page keeps its embedding.
+
+    Returns:
+        tuple: (chunks that still need embedding,
+                (chunk, stored embedding) pairs for chunks that moved,
+                ids of stored chunks no longer produced).
+    """
+    wanted = {}
+    for chunk in chunks:
+        wanted.setdefault(chunk_id(document_id, chunk), chunk)
+    if document_id is None:
+        return list(wanted.values()), [], []
+
+    collection = get_collection()
+    existing = set(collection.get(where={"document_id": document_id}, include=[])["ids"])
+    stored_by_digest = {id_.rsplit("-", 1)[1]: id_ for id_ in existing}
+
+    new_chunks, moved = [], []
+    for id_, chunk in wanted.items():
+        if id_ in existing:
+            continue
+        source_id = stored_by_digest.get(_chunk_digest(chunk))
+        if source_id is None:
+            new_chunks.append(chunk)
+        else:
+            moved.append((chunk, source_id))
+
+    reused = []
+    if moved:
+        stored = collection.get(ids=sorted({source_id for _, source_id in moved}), include=["embeddings"])
+        embeddings = dict(zip(stored["ids"], stored["embeddings"]))
+        reused = [(chunk, [float(x) for x in embeddings[source_id]]) for chunk, source_id in moved]
+
+    stale_ids = [id_ for id_ in existing if id_ not in wanted]
+    return new_chunks, reused, stale_ids
+
+def apply_document_chunks(document_id, new_chunks, embeddings, reused, stale_ids):
+    # Add before deleting so the document never disappears from search mid-update
+    store_chunks_in_chromadb(
+        document_id,
+        new_chunks + [chunk for chunk, _ in reused],
+        list(embeddings) + [embedding for _, embedding in reused]
+    )
+    if stale_ids:
+        get_collection().delete(ids=stale_ids)
+
+def _remove_upload(file_path):
+    # Only files we saved ourselves are ours to delete
+    if os.path.abspath(file_path).startswith(os.path.abspath(UPLOAD_DIR) + os.sep) and os.path.exists(file_path):
+        os.remove(file_path)
+
+def discard_upload(db, file_path):
+    """
+    Delete a saved upload after a failed ingestion, unless a Document row
+    already points at it (a replacement that got as far as the database).
+    """
+    if db.query(Document).filter(Document.file_path == file_path).first() is None:
+        _remove_upload(file_path)
+
+def ingest_document(db, file_path, title, document_id=None):
+    """
+    Add a PDF to the corpus, or replace the document `document_id` with it.
+
+    The PDF is parsed and its new chunks embedded before anything is written,
+    so a bad file or a failed embedding call leaves no rows behind. The rows are
+    then committed with is_processed=False and only flagged as processed once
+    the vector store matches them.
+
+    Args:
+        db (Session): Database session.
+        file_path (str): Path of the PDF on disk.
+        title (str): Title to store for the document.
+        document_id (int): Optional. Id of an existing document to replace.
+
+    Returns:
+        dict: Summary with the document id and chunk counts.
+
+    Raises:
+        LookupError: If `document_id` does not match an existing document.
+    """
+    with ingest_lock:
+        content_hash = file_sha256(file_path)
+
+        if document_id is None:
+            document = db.query(Document).filter(Document.content_hash == content_hash).first()
+            if document is None:
+                document = Document(title=title, file_path=file_path)
+        else:
+            document = db.get(Document, document_id)
+            if document is None:
+                raise LookupError(f"Document {document_id} not found")
+
+        if document.is_processed and document.content_hash == content_hash:
+            # Same bytes as what is already indexed: nothing to embed
+            if file_path != document.file_path:
+                _remove_upload(file_path)
+            return {
+                "document_id": document.id,
+                "num_chunks": len(get_collection().get(where={"document_id": document.id}, include=[])["ids"]),
+                "embedded_chunks": 0,
+                "moved_chunks": 0,
+                "removed_chunks": 0,
+            }
+
+        pages = extract_pages(file_path)
+        chunks = split_pages_into_chunks(pages)
+        new_chunks, reused, stale_ids = plan_document_chunks(document.id, chunks)
+        embeddings = embed_chunks(new_chunks)
+
+        is_new = document.id is None
+        previous_path = document.file_path
+        document.title = title
+        document.file_path = file_path
+        document.content_hash = content_hash
+        document.is_processed = False
+        document.pages = [
+            DocumentPage(page_number=page["page_number"], content=page["content"])
+            for page in pages
+        ]
+        db.add(document)
+        db.commit()
+
+        try:
+            apply_document_chunks(document.id, new_chunks, embeddings, reused, stale_ids)
+        except Exception:
+            if is_new:
+                # Leave nothing behind for a document that never made it into the index
+                get_collection().delete(where={"document_id": document.id})
+                db.delete(document)
+                db.commit()
+            raise
+
+        document.is_processed = True
+        for page in document.pages:
+            page.is_processed = True
+        db.commit()
+
+        if new_chunks or reused or stale_ids:
+            index_changed()
+
+        if previous_path and previous_path != file_path:
+            _remove_upload(previous_path)
+
+        return {
+            "document_id": document.id,
+            "num_chunks": len(chunks),
+            "embedded_chunks": len(new_chunks),
+            "moved_chunks": len(reused),
+            "removed_chunks": len(stale_ids),
+        }
+
+def delete_document(db, document_id):
+    """
+    Remove a document, its pages and all of its vectors.
+
+    Raises:
+        LookupError: If `document_id` does not match an existing document.
+    """
+    with ingest_lock:
+        document = db.get(Document, document_id)
+        if document is None:
+            raise LookupError(f"Document {document_id} not found")
+
+        get_collection().delete(where={"document_id": document_id})
+        file_path = document.file_path
+        db.delete(document)
+        db.commit()
+        index_changed()
+        _remove_upload(file_path)
+
+def default_document_pending(db):
+    """
+    True until the bundled document has been indexed once. The mark is kept on
+    the collection itself, so deleting that document later survives restarts.
+    """
+    collection = get_collection()
+    if (collection.metadata or {}).get(DEFAULT_SEEDED_KEY):
+        return False
+    if db.query(Document).first() is not None:
+        # Corpus from before the mark existed: it was seeded already
+        mark_default_document_seeded()
+        return False
+    return True
+
+def mark_default_document_seeded():
+    collection = get_collection()
+    collection.modify(metadata={**(collection.metadata or {}), DEFAULT_SEEDED_KEY: True})
+
+def list_documents(db):
+    return [
+        {
+            "document_id": document.id,
+            "title": document.title,
+            "is_processed": document.is_processed,
+            "num_pages": len(document.pages),
+        }
+        for document in db.query(Document).order_by(Document.id)
+    ]
@@ -1,74 +1,37 @@
-from chromadb import Client as ChromaClient
-from chromadb.config import Settings
 import os
 from groq import Groq
-from PyPDF2 import PdfReader
 from langchain.vectorstores import Chroma
-from uuid import uuid4
 from dotenv import load_dotenv
-import shutil
-import chromadb
+from db import SessionLocal
+from services.cache import cache_get, cache_set, make_key
+from services.vector_index import COLLECTION_NAME, EMBEDDING_MODEL, current_index_version, get_query_client, query_client
 load_dotenv()
 
+RESPONSE_CACHE_TTL = 3600
+GENERATION_ERROR_MESSAGE = "Unable to generate a response at this time."
+
 
 from langchain_openai import OpenAIEmbeddings  # Note the import from langchain_openai
 
-def initialize_clients():
+def initialize_clients(chroma_client=None):
     # Initialize Groq
     groq_api_key = os.getenv('GROQ_API_KEY')
     groq_client = Groq(api_key=groq_api_key)
     
-    # Initialize OpenAI embeddings
+    # Initialize OpenAI embeddings (same model the corpus was embedded with)
     openai_api_key = os.getenv('OPENAI_API_KEY')  # Make sure to set this in your environment
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-    
-    chroma_dir = "./chroma_data"
-    try:
-        if os.path.exists(chroma_dir):
-            shutil.rmtree(chroma_dir)
-    except PermissionError:
-        print("Warning: Could not delete existing database")
-        
-    os.makedirs(chroma_dir, exist_ok=True)
+    embeddings = OpenAIEmbeddings(api_key=openai_api_key, model=EMBEDDING_MODEL)
     
-    # Use OpenAI embeddings with Chroma
+    # Read the corpus: the live index, or the latest snapshot on reader workers
     docsearch = Chroma(
-        persist_directory=chroma_dir,
+        client=chroma_client if chroma_client is not None else get_query_client(),
+        collection_name=COLLECTION_NAME,
         embedding_function=embeddings
     )
     
     return groq_client, docsearch
 
 
-# def store_document_in_chroma(docsearch, pdf_path):
-#     try:
-#         # Your existing document processing code here
-#         docsearch.add_texts([chunk], ids=[doc_id])
-#     finally:
-#         # Ensure the database is properly persisted
-#         if hasattr(docsearch, '_client'):
-#             docsearch._client.persist()
-
-def extract_text_from_pdf(pdf_path):
-    try:
-        reader = PdfReader(pdf_path)
-        text_chunks = [page.extract_text() for page in reader.pages if page.extract_text()]
-        return text_chunks
-    except Exception as e:
-        print(f"Error extracting text from PDF: {str(e)}")
-        return []
-
-def store_document_in_chroma(docsearch, pdf_path):
-    text_chunks = extract_text_from_pdf(pdf_path)
-    if not text_chunks:
-        print("No text extracted from PDF.")
-        return
-    
-    for chunk in text_chunks:
-        doc_id = str(uuid4())
-        docsearch.add_texts([chunk], ids=[doc_id])
-    print("Document successfully stored in Chroma.")
-
 def get_relevant_excerpts(docsearch, user_question):
     try:
         relevant_docs = docsearch.similarity_search(user_question)
@@ -99,17 +62,42 @@ def generate_response(groq_client, user_question, relevant_excerpts):
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error generating response: {str(e)}")
-        return "Unable to generate a response at this time."
+        return GENERATION_ERROR_MESSAGE
+
+def answer_question(user_question):
+    """
+    Answer a food question from the corpus. Answers are cached per index
+    version, so publishing a new snapshot naturally invalidates them.
+    """
+    key = make_key("food", current_index_version(), user_question.strip().lower())
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    # Hold the snapshot open for the whole answer; requests run concurrently
+    with query_client() as chroma_client:
+        groq_client, docsearch = initialize_clients(chroma_client)
+        relevant_excerpts = get_relevant_excerpts(docsearch, user_question)
+    response = generate_response(groq_client, user_question, relevant_excerpts)
+
+    # Don't pin transient retrieval or generation failures in the cache
+    if relevant_excerpts and response != GENERATION_ERROR_MESSAGE:
+        cache_set(key, response, RESPONSE_CACHE_TTL)
+    return response
 
 def main():
+    # Importing ingestion sets up the database schema, which only this CLI needs here
+    from services.process_documents import ingest_document
+
     print("PDF Document QA using Chroma and Groq Llama")
     
     # Initialize clients
     groq_client, docsearch = initialize_clients()
     
+    db = SessionLocal()
     try:
         pdf_path = "./food.pdf"
-        store_document_in_chroma(docsearch, pdf_path)
+        ingest_document(db, pdf_path, os.path.basename(pdf_path))
         
         while True:
             user_question = input("Enter your question (or 'quit' to exit): ")
@@ -124,9 +112,7 @@ def main():
                 print("No relevant excerpts found.")
     
     finally:
-        # Clean up Chroma data
-        if os.path.exists("./chroma_data"):
-            shutil.rmtree("./chroma_data")
+        db.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,273 @@
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+import chromadb
+from dotenv import load_dotenv
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-worker mode, so no writer lock either
+    fcntl = None
+load_dotenv()
+
+# standalone: a single process that both ingests and answers (the default).
+# writer: the one process that ingests; it publishes a snapshot after each change
+#         and answers queries from the published snapshot, like a reader.
+# reader: a serving worker; it only queries the latest published snapshot.
+APP_ROLE = os.getenv("APP_ROLE", "standalone")
+
+CHROMA_DIR = "./chroma_data"
+COLLECTION_NAME = "documents"
+# Ingestion and queries must embed with the same model
+EMBEDDING_MODEL = "text-embedding-3-small"
+SNAPSHOT_DIR = "./chroma_snapshots"
+CURRENT_SNAPSHOT_FILE = os.path.join(SNAPSHOT_DIR, "CURRENT")
+WRITER_LOCK_PATH = "./chroma_writer.lock"
+KEEP_SNAPSHOTS = 3
+SNAPSHOT_GRACE_SECONDS = 300
+READER_COPIES = ".readers"
+
+# Serialises every change to the live index together with its snapshot publish
+ingest_lock = threading.RLock()
+_lock = threading.Lock()
+_reader_lock = threading.Lock()
+_writer_lock_file = None
+_writer_client = None
+_live_version = f"live-{time.time_ns()}"
+_published_version = None
+_reader_version = None
+_reader_client = None
+_reader_dir = None
+_reader_users = {}  # private copy dir -> queries currently using it
+_retired_readers = []  # (client, dir) pairs replaced by a newer snapshot
+
+def _new_version():
+    # Sortable by creation time, unique across processes
+    return f"{time.time_ns()}-{uuid4().hex[:8]}"
+
+def _snapshot_created_at(version):
+    return int(version.split("-", 1)[0]) / 1e9
+
+def acquire_writer_lock():
+    """
+    Take an exclusive lock on the live index so that a second process trying to
+    write it fails fast instead of corrupting it or racing the first one.
+    """
+    global _writer_lock_file
+    if _writer_lock_file is not None or fcntl is None:
+        return
+
+    lock_file = open(WRITER_LOCK_PATH, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(
+            f"Another process already owns {CHROMA_DIR}; start extra workers with APP_ROLE=reader"
+        )
+    _writer_lock_file = lock_file
+
+def get_writer_client():
+    global _writer_client
+    if APP_ROLE == "reader":
+        raise RuntimeError("Reader workers cannot modify the index; ingestion is owned by the writer process")
+
+    with _lock:
+        if _writer_client is None:
+            acquire_writer_lock()
+            _writer_client = chromadb.PersistentClient(path=CHROMA_DIR)
+        return _writer_client
+
+def current_snapshot():
+    try:
+        with open(CURRENT_SNAPSHOT_FILE) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def publish_snapshot():
+    """
+    Copy the live index into a new immutable snapshot directory and point
+    CURRENT at it. The pointer is swapped with os.replace, so readers see
+    either the previous snapshot or the new one, never a partial copy.
+
+    This copies the whole index, so each change costs O(corpus size) on disk.
+    Callers must hold ingest_lock.
+
+    Returns:
+        str: The version name of the published snapshot.
+    """
+    global _writer_client, _published_version
+    version = _new_version()
+    staging_dir = os.path.join(SNAPSHOT_DIR, f".staging-{version}")
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+    with _lock:
+        # Closing the client flushes chroma's HNSW files and sqlite state, so the
+        # copy is complete on its own; the next write reopens the live index.
+        if _writer_client is not None:
+            _writer_client.close()
+            _writer_client = None
+        shutil.copytree(CHROMA_DIR, staging_dir)
+        os.rename(staging_dir, os.path.join(SNAPSHOT_DIR, version))
+
+        pointer_tmp = f"{CURRENT_SNAPSHOT_FILE}.{version}.tmp"
+        with open(pointer_tmp, "w") as file:
+            file.write(version)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(pointer_tmp, CURRENT_SNAPSHOT_FILE)
+        _published_version = version
+
+    prune_snapshots()
+    return version
+
+def _process_alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def prune_snapshots():
+    """
+    Remove old snapshots, keeping the newest KEEP_SNAPSHOTS and any snapshot
+    superseded less than SNAPSHOT_GRACE_SECONDS ago, so readers still copying
+    it can finish first. Also removes private copies left by dead readers.
+    """
+    versions = []
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith(".") or not os.path.isdir(os.path.join(SNAPSHOT_DIR, name)):
+            continue
+        try:
+            versions.append((_snapshot_created_at(name), name))
+        except ValueError:
+            continue
+    versions.sort()
+
+    current = current_snapshot()
+    cutoff = time.time() - SNAPSHOT_GRACE_SECONDS
+    for i in range(len(versions) - KEEP_SNAPSHOTS):
+        version = versions[i][1]
+        # A snapshot stopped being CURRENT when the next one was published
+        superseded_at = versions[i + 1][0]
+        if version != current and superseded_at < cutoff:
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, version), ignore_errors=True)
+
+    copies_dir = os.path.join(SNAPSHOT_DIR, READER_COPIES)
+    if os.path.isdir(copies_dir):
+        for name in os.listdir(copies_dir):
+            pid = name.split("-", 1)[0]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                shutil.rmtree(os.path.join(copies_dir, name), ignore_errors=True)
+
+def index_changed():
+    """
+    Called by the ingestion code after every add, replace or delete.
+    """
+    global _live_version
+    _live_version = _new_version()
+    if APP_ROLE == "writer":
+        publish_snapshot()
+
+def ensure_snapshot():
+    """
+    Publish once whenever a writer starts. The live index may have moved on
+    since CURRENT was written (a standalone run in between, or a crash between
+    a change and its publish), and readers must not keep serving that.
+    """
+    if APP_ROLE != "writer" or _published_version is not None:
+        return
+    with ingest_lock:
+        get_writer_client().get_or_create_collection(COLLECTION_NAME)
+        publish_snapshot()
+
+def current_index_version():
+    if APP_ROLE == "standalone":
+        return _live_version
+    return current_snapshot()
+
+def _release_retired_readers():
+    # Caller holds _reader_lock
+    still_used = []
+    for client, path in _retired_readers:
+        if _reader_users.get(path):
+            still_used.append((client, path))
+            continue
+        # Stops the old system and drops it from chroma's shared client cache
+        client.close()
+        shutil.rmtree(path, ignore_errors=True)
+    _retired_readers[:] = still_used
+
+def _open_snapshot(version):
+    """
+    Open `version` through a copy private to this process. Chroma writes to its
+    directory even when only queried, so published snapshots are never opened
+    directly; that keeps them immutable while several workers read them.
+    Caller holds _reader_lock.
+    """
+    global _reader_version, _reader_client, _reader_dir
+    private_dir = os.path.join(SNAPSHOT_DIR, READER_COPIES, f"{os.getpid()}-{version}")
+    shutil.rmtree(private_dir, ignore_errors=True)
+    shutil.copytree(os.path.join(SNAPSHOT_DIR, version), private_dir)
+    client = chromadb.PersistentClient(path=private_dir)
+
+    if _reader_client is not None:
+        _retired_readers.append((_reader_client, _reader_dir))
+    _reader_client, _reader_version, _reader_dir = client, version, private_dir
+    _release_retired_readers()
+
+def _switch_to_current_snapshot():
+    # Caller holds _reader_lock
+    version = current_snapshot()
+    if version is None:
+        raise RuntimeError("No index snapshot has been published yet; is the writer process running?")
+    if version != _reader_version:
+        _open_snapshot(version)
+
+def get_query_client():
+    """
+    Return the chroma client queries should use. Readers and the writer query
+    the published snapshot and switch when CURRENT changes; a standalone
+    server queries the live index. Concurrent request handlers should use
+    query_client() instead, so a switch cannot close a client mid-query.
+
+    Raises:
+        RuntimeError: If no snapshot was published yet.
+    """
+    if APP_ROLE == "standalone":
+        return get_writer_client()
+
+    with _reader_lock:
+        _switch_to_current_snapshot()
+        return _reader_client
+
+@contextmanager
+def query_client():
+    """
+    Like get_query_client(), but the snapshot stays open until the block exits
+    even if a newer one is published meanwhile; it is closed by whichever
+    query finishes with it last.
+    """
+    if APP_ROLE == "standalone":
+        yield get_writer_client()
+        return
+
+    with _reader_lock:
+        _switch_to_current_snapshot()
+        client, path = _reader_client, _reader_dir
+        _reader_users[path] = _reader_users.get(path, 0) + 1
+    try:
+        yield client
+    finally:
+        with _reader_lock:
+            _reader_users[path] -= 1
+            if not _reader_users[path]:
+                del _reader_users[path]
+            _release_retired_readers()
@@ -3,8 +3,11 @@ import os
 import requests
 from dotenv import load_dotenv
 from openai import OpenAI
+from services.cache import cache_get, cache_set, make_key
 load_dotenv()
 
+WEATHER_CACHE_TTL = 600
+
 
 client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY")
@@ -23,6 +26,11 @@ def fetch_weather_data(latitude, longitude, date=None, forecast_days=None):
     Returns:
         str: JSON string containing the weather data or an error message.
     """
+    cache_key = make_key("weather", latitude, longitude, date, forecast_days)
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     base = "http://api.weatherapi.com/v1"
     key = os.getenv("WEATHER_API_KEY")
 
@@ -45,10 +53,13 @@ def fetch_weather_data(latitude, longitude, date=None, forecast_days=None):
         return json.dumps({"error": f"API request failed with status code {response.status_code}", "details": response.text})
 
     try:
-        return json.dumps(response.json())
+        data = json.dumps(response.json())
     except ValueError:
         return json.dumps({"error": "Failed to parse JSON from Weather API response"})
 
+    cache_set(cache_key, data, WEATHER_CACHE_TTL)
+    return data
+
 def get_weather_response(latitude, longitude, date=None, forecast_days=None):
     raw_data = fetch_weather_data(latitude, longitude, date, forecast_days)
     data = json.loads(raw_data)
@@ -0,0 +1,14 @@
+import multiprocessing
+import os
+
+# Query workers: each one opens the latest published index snapshot read-only
+# and shares the response/weather cache through SQLite. Run exactly one writer
+# next to them (APP_ROLE=writer python app/main.py) to own ingestion.
+os.environ.setdefault("APP_ROLE", "reader")
+os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+pythonpath = "app"
+wsgi_app = "main:app"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+# The app resolves ./test.db, ./chroma_data, ... against the working directory
+# at import time, so import it from a scratch directory with dummy API keys.
+os.chdir(tempfile.mkdtemp(prefix="conv-ai-tests-"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("APP_ROLE", "standalone")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db import Base
+import models  # noqa: F401  (registers the tables on Base)
+from services import vector_index
+
+
+@pytest.fixture
+def index_dirs(tmp_path, monkeypatch):
+    """Point the vector index at a temporary directory and reset its process state."""
+    snapshot_dir = tmp_path / "chroma_snapshots"
+    monkeypatch.setattr(vector_index, "APP_ROLE", "standalone")
+    monkeypatch.setattr(vector_index, "CHROMA_DIR", str(tmp_path / "chroma_data"))
+    monkeypatch.setattr(vector_index, "SNAPSHOT_DIR", str(snapshot_dir))
+    monkeypatch.setattr(vector_index, "CURRENT_SNAPSHOT_FILE", str(snapshot_dir / "CURRENT"))
+    monkeypatch.setattr(vector_index, "WRITER_LOCK_PATH", str(tmp_path / "chroma_writer.lock"))
+    monkeypatch.setattr(vector_index, "_writer_client", None)
+    monkeypatch.setattr(vector_index, "_writer_lock_file", None)
+    monkeypatch.setattr(vector_index, "_reader_client", None)
+    monkeypatch.setattr(vector_index, "_reader_version", None)
+    monkeypatch.setattr(vector_index, "_reader_dir", None)
+    monkeypatch.setattr(vector_index, "_published_version", None)
+    monkeypatch.setattr(vector_index, "_reader_users", {})
+    monkeypatch.setattr(vector_index, "_retired_readers", [])
+    yield tmp_path
+    retired = [client for client, _ in vector_index._retired_readers]
+    for client in [vector_index._writer_client, vector_index._reader_client] + retired:
+        if client is not None:
+            client.close()
+    if vector_index._writer_lock_file is not None:
+        vector_index._writer_lock_file.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
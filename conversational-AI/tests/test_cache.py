@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", request.param)
+    monkeypatch.setattr(cache, "CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "_sqlite_ready", False)
+    monkeypatch.setattr(cache, "_memory", {})
+    return request.param
+
+
+def test_entries_expire_after_their_ttl(backend, clock):
+    key = cache.make_key("weather", "36.8", "10.1", None, None)
+    cache.cache_set(key, "sunny", ttl=60)
+    assert cache.cache_get(key) == "sunny"
+
+    clock[0] += 61
+    assert cache.cache_get(key) is None
+
+
+def test_keys_depend_on_every_part():
+    assert cache.make_key("food", "v1", "pasta") == cache.make_key("food", "v1", "pasta")
+    assert cache.make_key("food", "v1", "pasta") != cache.make_key("food", "v2", "pasta")
+
+
+def test_memory_cache_evicts_expired_then_soonest_to_expire(monkeypatch, clock):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(cache, "_memory", {})
+    monkeypatch.setattr(cache, "MEMORY_CACHE_MAX_ENTRIES", 2)
+
+    cache.cache_set("short", "1", ttl=5)
+    cache.cache_set("long", "2", ttl=100)
+    cache.cache_set("new", "3", ttl=50)
+    assert cache.cache_get("short") is None
+    assert cache.cache_get("long") == "2"
+
+    clock[0] += 60
+    cache.cache_set("newer", "4", ttl=50)
+    # "new" expired and was dropped first
+    assert set(cache._memory) == {"long", "newer"}
+
+
+def test_sqlite_cache_is_shared_between_processes(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "sqlite")
+    monkeypatch.setattr(cache, "CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "_sqlite_ready", False)
+    cache.cache_set("answer", "42", ttl=60)
+
+    # A second worker starts with no in-process state of its own
+    monkeypatch.setattr(cache, "_sqlite_ready", False)
+    monkeypatch.setattr(cache, "_memory", {})
+    assert cache.cache_get("answer") == "42"
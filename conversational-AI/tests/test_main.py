@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from db import Base
+from services import process_documents, vector_index
+
+FOOD_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "food.pdf")
+
+
+@pytest.fixture
+def app_client(index_dirs, monkeypatch):
+    engine = create_engine(f"sqlite:///{index_dirs / 'app.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(main, "SessionLocal", SessionLocal)
+    monkeypatch.setattr(main, "DEFAULT_PDF_PATH", FOOD_PDF)
+    monkeypatch.setattr(process_documents, "UPLOAD_DIR", str(index_dirs / "uploads"))
+    main.app.dependency_overrides[main.get_db] = get_db
+    yield lambda: TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def fake_embed(chunks, batch_size=100):
+    return [[float(len(chunk["content"])), 1.0, 0.0] for chunk in chunks]
+
+
+def test_startup_survives_an_embedding_failure(app_client, monkeypatch):
+    def failing_embed(chunks, batch_size=100):
+        raise ConnectionError("OpenAI unreachable")
+
+    monkeypatch.setattr(process_documents, "embed_chunks", failing_embed)
+    monkeypatch.setattr(vector_index, "APP_ROLE", "writer")
+
+    with app_client() as client:
+        assert client.get("/").status_code == 200
+        assert client.get("/documents").json() == {"documents": []}
+    # The writer still published a snapshot for the readers
+    assert vector_index.current_snapshot() is not None
+
+
+def test_deleting_the_seeded_document_survives_a_restart(app_client, monkeypatch):
+    monkeypatch.setattr(process_documents, "embed_chunks", fake_embed)
+
+    with app_client() as client:
+        documents = client.get("/documents").json()["documents"]
+        assert [document["title"] for document in documents] == ["food.pdf"]
+        assert client.delete(f"/documents/{documents[0]['document_id']}").status_code == 200
+
+    with app_client() as client:
+        assert client.get("/documents").json() == {"documents": []}
+    assert os.path.exists(FOOD_PDF)
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from models import Document, DocumentPage
+from services import process_documents
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(process_documents.__file__)))
+
+
+@pytest.fixture
+def corpus(index_dirs, monkeypatch):
+    """
+    Ingest plain-text "PDFs" (pages separated by form feeds) with a fake
+    embedder that records every chunk it is asked to embed.
+    """
+    embedded = []
+
+    def fake_embed(chunks, batch_size=100):
+        embedded.extend(chunk["content"] for chunk in chunks)
+        return [[float(len(chunk["content"])), 1.0, 0.0] for chunk in chunks]
+
+    def fake_extract(file_path):
+        with open(file_path) as file:
+            return [
+                {"page_number": number, "content": page}
+                for number, page in enumerate(file.read().split("\f"))
+                if page
+            ]
+
+    upload_dir = index_dirs / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(process_documents, "embed_chunks", fake_embed)
+    monkeypatch.setattr(process_documents, "extract_pages", fake_extract)
+    monkeypatch.setattr(process_documents, "UPLOAD_DIR", str(upload_dir))
+
+    def upload(name, *pages):
+        path = upload_dir / name
+        path.write_text("\f".join(pages))
+        return str(path)
+
+    return upload, embedded
+
+
+def stored_ids(document_id):
+    return set(process_documents.get_collection().get(where={"document_id": document_id}, include=[])["ids"])
+
+
+def test_reuploading_identical_bytes_embeds_nothing(db, corpus):
+    upload, embedded = corpus
+    first = process_documents.ingest_document(db, upload("a.pdf", "apples", "pears"), "a.pdf")
+    assert first["embedded_chunks"] == 2
+    embedded.clear()
+
+    copy_path = upload("a-copy.pdf", "apples", "pears")
+    second = process_documents.ingest_document(db, copy_path, "a.pdf")
+
+    assert second["document_id"] == first["document_id"]
+    assert second["embedded_chunks"] == 0
+    assert embedded == []
+    assert db.query(Document).count() == 1
+    assert not os.path.exists(copy_path)
+
+
+def test_replace_embeds_only_changed_chunks_and_drops_stale_ones(db, corpus):
+    upload, embedded = corpus
+    old_path = upload("v1.pdf", "apples", "pears", "plums")
+    document_id = process_documents.ingest_document(db, old_path, "v1.pdf")["document_id"]
+    before = stored_ids(document_id)
+    embedded.clear()
+
+    result = process_documents.ingest_document(
+        db, upload("v2.pdf", "apples", "cherries", "plums"), "v2.pdf", document_id=document_id
+    )
+
+    assert embedded == ["cherries"]
+    assert result["embedded_chunks"] == 1
+    assert result["removed_chunks"] == 1
+    after = stored_ids(document_id)
+    assert len(after) == 3
+    assert len(before & after) == 2
+    pages = db.query(DocumentPage).filter(DocumentPage.document_id == document_id).order_by(DocumentPage.page_number)
+    assert [page.content for page in pages] == ["apples", "cherries", "plums"]
+    assert all(page.is_processed for page in pages)
+    assert not os.path.exists(old_path)
+
+
+def test_inserting_a_page_reuses_embeddings_of_shifted_chunks(db, corpus):
+    upload, embedded = corpus
+    document_id = process_documents.ingest_document(db, upload("v1.pdf", "apples", "pears"), "v1.pdf")["document_id"]
+    collection = process_documents.get_collection()
+    before = collection.get(where={"document_id": document_id}, include=["documents", "embeddings"])
+    old_embeddings = {text: list(vector) for text, vector in zip(before["documents"], before["embeddings"])}
+    embedded.clear()
+
+    result = process_documents.ingest_document(
+        db, upload("v2.pdf", "cover", "apples", "pears"), "v2.pdf", document_id=document_id
+    )
+
+    assert embedded == ["cover"]
+    assert (result["embedded_chunks"], result["moved_chunks"], result["removed_chunks"]) == (1, 2, 2)
+    after = collection.get(where={"document_id": document_id}, include=["documents", "metadatas", "embeddings"])
+    pages = {text: metadata["page_number"] for text, metadata in zip(after["documents"], after["metadatas"])}
+    assert pages == {"cover": 0, "apples": 1, "pears": 2}
+    for text, vector in zip(after["documents"], after["embeddings"]):
+        if text in old_embeddings:
+            assert list(vector) == old_embeddings[text]
+
+
+def test_replace_unknown_document_raises_lookup_error(db, corpus):
+    upload, _ = corpus
+    with pytest.raises(LookupError):
+        process_documents.ingest_document(db, upload("x.pdf", "kiwi"), "x.pdf", document_id=42)
+
+
+def test_delete_removes_vectors_and_rows(db, corpus):
+    upload, _ = corpus
+    path = upload("a.pdf", "apples", "pears")
+    keep_id = process_documents.ingest_document(db, upload("b.pdf", "bread"), "b.pdf")["document_id"]
+    document_id = process_documents.ingest_document(db, path, "a.pdf")["document_id"]
+
+    process_documents.delete_document(db, document_id)
+
+    assert stored_ids(document_id) == set()
+    assert len(stored_ids(keep_id)) == 1
+    assert db.get(Document, document_id) is None
+    assert db.query(DocumentPage).filter(DocumentPage.document_id == document_id).count() == 0
+    assert not os.path.exists(path)
+    with pytest.raises(LookupError):
+        process_documents.delete_document(db, document_id)
+
+
+def test_failed_embedding_leaves_no_rows_and_discards_upload(db, corpus, monkeypatch):
+    upload, _ = corpus
+    path = upload("broken.pdf", "apples")
+
+    def failing_embed(chunks, batch_size=100):
+        raise RuntimeError("embedding service down")
+
+    monkeypatch.setattr(process_documents, "embed_chunks", failing_embed)
+    with pytest.raises(RuntimeError):
+        process_documents.ingest_document(db, path, "broken.pdf")
+    db.rollback()
+    process_documents.discard_upload(db, path)
+
+    assert db.query(Document).count() == 0
+    assert not os.path.exists(path)
+
+
+def test_upgrade_schema_migrates_baseline_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE documents (id INTEGER NOT NULL, title VARCHAR, file_path VARCHAR, "
+            "is_processed BOOLEAN, PRIMARY KEY (id))"
+        ))
+        conn.execute(text(
+            "CREATE TABLE document_pages (document_id INTEGER, page_number INTEGER NOT NULL, "
+            "content VARCHAR, is_processed BOOLEAN, PRIMARY KEY (page_number))"
+        ))
+        conn.execute(text("CREATE INDEX ix_document_pages_document_id ON document_pages (document_id)"))
+        conn.execute(text("INSERT INTO documents (id, title, file_path, is_processed) VALUES (1, 't', 'f', 1)"))
+        conn.execute(text("INSERT INTO document_pages VALUES (1, 0, 'page one', 1)"))
+
+    process_documents.upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    assert "content_hash" in {column["name"] for column in inspector.get_columns("documents")}
+    assert "id" in {column["name"] for column in inspector.get_columns("document_pages")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT document_id, page_number, content FROM document_pages")).fetchall() == [
+            (1, 0, "page one")
+        ]
+    # Running it again on an up-to-date database is a no-op
+    process_documents.upgrade_schema(engine)
+    engine.dispose()
+
+
+def test_reader_import_leaves_the_schema_alone(tmp_path):
+    with sqlite3.connect(tmp_path / "test.db") as conn:
+        conn.execute(
+            "CREATE TABLE documents (id INTEGER NOT NULL, title VARCHAR, file_path VARCHAR, "
+            "is_processed BOOLEAN, PRIMARY KEY (id))"
+        )
+
+    subprocess.run(
+        [sys.executable, "-c", "import services.process_documents"],
+        cwd=tmp_path,
+        env={**os.environ, "APP_ROLE": "reader", "PYTHONPATH": APP_DIR},
+        check=True,
+    )
+
+    with sqlite3.connect(tmp_path / "test.db") as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "content_hash" not in columns
+    assert tables == {"documents"}
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import time
+
+import pytest
+from chromadb.api.shared_system_client import SharedSystemClient
+
+from services import vector_index
+
+
+def add_vectors(*ids):
+    collection = vector_index.get_writer_client().get_or_create_collection(vector_index.COLLECTION_NAME)
+    collection.upsert(
+        ids=list(ids),
+        embeddings=[[float(len(id_)), 1.0, 0.0] for id_ in ids],
+        documents=list(ids),
+        metadatas=[{"document_id": 1} for _ in ids],
+    )
+
+
+def query_count():
+    return vector_index.get_query_client().get_collection(vector_index.COLLECTION_NAME).count()
+
+
+def tree_digest(path):
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as file:
+                digest.update(name.encode() + file.read())
+    return digest.hexdigest()
+
+
+def test_second_writer_is_refused(index_dirs):
+    fcntl = pytest.importorskip("fcntl")
+    other_process = open(vector_index.WRITER_LOCK_PATH, "w")
+    fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    try:
+        with pytest.raises(RuntimeError, match="already owns"):
+            vector_index.get_writer_client()
+    finally:
+        other_process.close()
+
+
+def test_reader_cannot_open_the_live_index(index_dirs, monkeypatch):
+    monkeypatch.setattr(vector_index, "APP_ROLE", "reader")
+    with pytest.raises(RuntimeError, match="Reader workers"):
+        vector_index.get_writer_client()
+    with pytest.raises(RuntimeError, match="No index snapshot"):
+        vector_index.get_query_client()
+
+
+def test_index_version_changes_after_every_change(index_dirs, monkeypatch):
+    before = vector_index.current_index_version()
+    add_vectors("a")
+    vector_index.index_changed()
+    assert vector_index.current_index_version() != before
+
+    monkeypatch.setattr(vector_index, "APP_ROLE", "writer")
+    vector_index.ensure_snapshot()
+    published = vector_index.current_index_version()
+    add_vectors("b")
+    vector_index.index_changed()
+    # The writer answers from snapshots too, so its cache keys must move on
+    assert vector_index.current_index_version() not in (None, published)
+
+
+def test_writer_publishes_on_every_startup(index_dirs, monkeypatch):
+    monkeypatch.setattr(vector_index, "APP_ROLE", "writer")
+    add_vectors("a")
+    old = vector_index.publish_snapshot()
+    # A restarted writer whose live index changed without a publish
+    add_vectors("b")
+    monkeypatch.setattr(vector_index, "_published_version", None)
+
+    vector_index.ensure_snapshot()
+
+    assert vector_index.current_snapshot() != old
+    assert query_count() == 2
+
+
+def test_readers_switch_snapshots_and_release_the_old_one(index_dirs, monkeypatch):
+    monkeypatch.setattr(vector_index, "APP_ROLE", "writer")
+    add_vectors("a")
+    first = vector_index.publish_snapshot()
+    first_dir = os.path.join(vector_index.SNAPSHOT_DIR, first)
+    published_digest = tree_digest(first_dir)
+
+    monkeypatch.setattr(vector_index, "APP_ROLE", "reader")
+    assert query_count() == 1
+    first_copy = vector_index._reader_dir
+    assert tree_digest(first_dir) == published_digest
+
+    monkeypatch.setattr(vector_index, "APP_ROLE", "writer")
+    add_vectors("b")
+    vector_index.publish_snapshot()
+
+    monkeypatch.setattr(vector_index, "APP_ROLE", "reader")
+    assert query_count() == 2
+    assert not os.path.exists(first_copy)
+    assert not any(first_copy in identifier for identifier in SharedSystemClient._identifier_to_system)
+
+
+def make_snapshot(created_at):
+    version = f"{int(created_at * 1e9)}-0000abcd"
+    os.makedirs(os.path.join(vector_index.SNAPSHOT_DIR, version))
+    return version
+
+
+def test_prune_measures_grace_from_when_a_snapshot_was_superseded(index_dirs):
+    now = time.time()
+    ancient = make_snapshot(now - 7200)
+    in_use = make_snapshot(now - 3600)
+    newest = [make_snapshot(now - 10), make_snapshot(now - 5), make_snapshot(now - 1)]
+    with open(vector_index.CURRENT_SNAPSHOT_FILE, "w") as file:
+        file.write(newest[-1])
+
+    vector_index.prune_snapshots()
+
+    remaining = set(os.listdir(vector_index.SNAPSHOT_DIR))
+    assert ancient not in remaining
+    # Created an hour ago but CURRENT until 10s ago: readers may still be copying it
+    assert in_use in remaining
+    assert set(newest) <= remaining
+
+
+def test_prune_removes_copies_of_dead_readers(index_dirs):
+    make_snapshot(time.time())
+    copies = os.path.join(vector_index.SNAPSHOT_DIR, vector_index.READER_COPIES)
+    dead = os.path.join(copies, "999999999-1-0000abcd")
+    alive = os.path.join(copies, f"{os.getpid()}-1-0000abcd")
+    os.makedirs(dead)
+    os.makedirs(alive)
+
+    vector_index.prune_snapshots()
+
+    assert not os.path.exists(dead)
+    assert os.path.exists(alive)
+
+
+def test_snapshot_in_use_stays_open_until_its_query_finishes(index_dirs, monkeypatch):
+    monkeypatch.setattr(vector_index, "APP_ROLE", "writer")
+    add_vectors("a")
+    vector_index.publish_snapshot()
+
+    with vector_index.query_client() as in_flight:
+        first_copy = vector_index._reader_dir
+        add_vectors("b")
+        vector_index.publish_snapshot()
+
+        # Another request switches to the new snapshot meanwhile
+        with vector_index.query_client() as newer:
+            assert newer.get_collection(vector_index.COLLECTION_NAME).count() == 2
+        assert in_flight.get_collection(vector_index.COLLECTION_NAME).count() == 1
+        assert os.path.exists(first_copy)
+
+    assert not os.path.exists(first_copy)
+    assert vector_index._retired_readers == []